@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, Response
 import os
 import sys
 import json
@@ -13,9 +13,20 @@ try:
 except ImportError as e:
     print(f"警告: 无法导入orbit_calculations模块: {e}")
     # 创建一个虚拟函数以避免导入错误
-    def calculate_realistic_orbit_with_footprint(satellites, side_angle=20):
+    def calculate_realistic_orbit_with_footprint(satellites, side_angle=20, start_time=None):
         return []
 
+from ephemeris_cache import (
+    CompressedResponseCache, catalog_hash, time_bucket, make_etag, etag_matches, choose_encoding,
+    encoded_etag
+)
+from coverage_tiles import (
+    CoverageTileCache, tile_cache_key, MAX_TILE_ZOOM, TILE_WINDOW_SECONDS, MAX_SIDE_ANGLE,
+    SIDE_ANGLE_STEP
+)
+from ephemeris_scheduler import EphemerisScheduler, POLL_SECONDS
+from single_flight import SingleFlight, SingleFlightTimeout, DEFAULT_TIMEOUT
+
 app = Flask(__name__, 
     template_folder='templates',
     static_folder='static',
@@ -28,12 +39,46 @@ logger = logging.getLogger(__name__)
 
 # Cesium访问令牌 - 请确保这是有效的令牌
 from config import CESIUM_TOKEN
+
+# 星历后台刷新检查间隔（秒）和需要预热的侧摆角，可在config中覆盖
+# 轨道起始时间固定按 TIME_BUCKET_SECONDS 对齐，不受刷新间隔影响
+try:
+    from config import EPHEMERIS_REFRESH_SECONDS
+except ImportError:
+    EPHEMERIS_REFRESH_SECONDS = POLL_SECONDS
+
+try:
+    from config import WARM_SIDE_ANGLES
+except ImportError:
+    WARM_SIDE_ANGLES = [20]
+
+# 等待相同参数的进行中计算的超时时间（秒）
+try:
+    from config import ORBIT_COMPUTE_TIMEOUT
+except ImportError:
+    ORBIT_COMPUTE_TIMEOUT = DEFAULT_TIMEOUT
     
 # 模型URL - 使用一个可靠的卫星模型
 MODEL_URL = "https://raw.githubusercontent.com/KhronosGroup/glTF-Sample-Models/master/2.0/Duck/glTF/Duck.gltf"
 
-def get_satellite_file_path():
-    """获取卫星数据文件路径"""
+# 星历响应缓存：ETag -> 压缩后的响应体
+ephemeris_response_cache = CompressedResponseCache()
+
+# 覆盖热力图瓦片缓存目录
+TILE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tile_cache')
+
+# 合并相同参数的并发轨道计算
+orbit_flights = SingleFlight(timeout=ORBIT_COMPUTE_TIMEOUT)
+
+# 合并相同瓦片的并发光栅化，与轨道计算分开统计
+tile_flights = SingleFlight(timeout=ORBIT_COMPUTE_TIMEOUT)
+
+coverage_tile_cache = CoverageTileCache(
+    TILE_CACHE_DIR, flights=tile_flights, swath_flights=orbit_flights
+)
+
+def get_satellite_file_path(log=True):
+    """获取卫星数据文件路径，log=False 时不写日志（供后台轮询使用）"""
     possible_paths = [
         'satellite.txt',
         os.path.join(os.path.dirname(__file__), 'satellite.txt'),
@@ -42,10 +87,12 @@ def get_satellite_file_path():
 
     for path in possible_paths:
         if os.path.exists(path):
-            logger.info(f"找到卫星数据文件: {path}")
+            if log:
+                logger.info(f"找到卫星数据文件: {path}")
             return path
 
-    logger.warning("未找到卫星数据文件")
+    if log:
+        logger.warning("未找到卫星数据文件")
     return None
 
 def read_satellite_data():
@@ -107,38 +154,155 @@ def index():
                            cesium_token=CESIUM_TOKEN,
                            model_url=MODEL_URL)
 
+def not_modified_response(etag):
+    """返回304响应"""
+    response = Response(status=304)
+    response.headers['ETag'] = etag
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def ephemeris_response(entry, etag, bucket_start):
+    """根据客户端的Accept-Encoding返回缓存的星历响应"""
+    encoding = choose_encoding(request.accept_encodings, entry)
+    response = Response(entry[encoding], mimetype='application/json')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = encoded_etag(etag, encoding)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Ephemeris-Epoch'] = bucket_start.isoformat() + 'Z'
+    return response
+
+def compute_ephemeris_entry(side_angle, bucket_start, digest):
+    """计算指定侧摆角和时间桶的星历，写入响应缓存，返回 (etag, entry)"""
+    satellites = read_satellite_data()
+
+    valid_tle_satellites = [sat for sat in satellites if 'line1' in sat and 'line2' in sat]
+
+    logger.info(f"有效TLE卫星数量: {len(valid_tle_satellites)}")
+
+    if valid_tle_satellites:
+        # 使用导入的模块函数进行计算，起始时间对齐到时间桶
+        satellite_data = calculate_realistic_orbit_with_footprint(
+            valid_tle_satellites, side_angle, start_time=bucket_start
+        )
+    else:
+        logger.warning("没有有效的TLE数据")
+        satellite_data = []
+
+    # 添加统计信息
+    for i, sat in enumerate(satellite_data):
+        sat['id'] = i + 1
+        sat['color_index'] = i % 10  # 用于前端颜色选择
+
+    etag = make_etag(digest, bucket_start, side_angle=side_angle)
+    body = json.dumps(satellite_data, separators=(',', ':')).encode('utf-8')
+    entry = ephemeris_response_cache.put(etag, body)
+    return etag, entry
+
+def build_ephemeris_entry(side_angle, bucket_start, digest):
+    """计算星历，相同参数的并发调用（包括后台预计算）共享同一次计算"""
+    def compute():
+        # 上一次计算可能在本次请求查缓存之后、进入合并之前刚好完成
+        etag = make_etag(digest, bucket_start, side_angle=side_angle)
+        entry = ephemeris_response_cache.get(etag)
+        if entry is not None:
+            return etag, entry
+        return compute_ephemeris_entry(side_angle, bucket_start, digest)
+
+    key = ('ephemeris', digest, bucket_start, float(side_angle))
+    return orbit_flights.do(key, compute)
+
+# 星历后台预计算调度器，在setup_app中启动
+ephemeris_scheduler = EphemerisScheduler(
+    build_ephemeris_entry,
+    lambda: catalog_hash(get_satellite_file_path(log=False)),
+    side_angles=WARM_SIDE_ANGLES,
+    poll_seconds=EPHEMERIS_REFRESH_SECONDS
+)
+
 @app.route('/get_satellite_data')
 def get_satellite_data():
     """获取卫星位置数据 - 使用SGP4和footprint计算"""
     try:
-        satellites = read_satellite_data()
-
-        valid_tle_satellites = [sat for sat in satellites if 'line1' in sat and 'line2' in sat]
+        # 获取侧摆角度参数
+        side_angle = request.args.get('side_angle', default=20.0, type=float)
 
-        logger.info(f"有效TLE卫星数量: {len(valid_tle_satellites)}")
+        # ETag只依赖目录摘要、时间桶和参数，命中时无需任何计算
+        bucket_start = time_bucket()
+        digest = catalog_hash(get_satellite_file_path())
+        etag = make_etag(digest, bucket_start, side_angle=side_angle)
 
-        if not valid_tle_satellites:
-            logger.warning("没有有效的TLE数据")
-            return jsonify([])
+        matched_etag = etag_matches(request.headers.get('If-None-Match'), etag)
+        if matched_etag:
+            return not_modified_response(matched_etag)
 
-        # 获取侧摆角度参数
-        side_angle = request.args.get('side_angle', default=20, type=float)
+        # 优先使用后台预计算的快照，其次是响应缓存，最后才现场计算
+        entry = ephemeris_scheduler.lookup(etag) or ephemeris_response_cache.get(etag)
+        if entry is None:
+            etag, entry = build_ephemeris_entry(side_angle, bucket_start, digest)
 
-        # 使用导入的模块函数进行计算
-        satellite_data = calculate_realistic_orbit_with_footprint(valid_tle_satellites, side_angle)
-        
-        # 添加统计信息
-        for i, sat in enumerate(satellite_data):
-            sat['id'] = i + 1
-            sat['color_index'] = i % 10  # 用于前端颜色选择
-        
-        return jsonify(satellite_data)
+        return ephemeris_response(entry, etag, bucket_start)
 
+    except SingleFlightTimeout as e:
+        logger.warning(f"等待卫星轨道计算超时: {e}")
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         logger.error(f"计算卫星轨道时发生错误: {e}")
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def load_coverage_swaths(side_angle, window_start):
+    """计算覆盖热力图所需的条带数据，并发合并由瓦片缓存负责"""
+    satellites = read_satellite_data()
+    valid_tle_satellites = [sat for sat in satellites if 'line1' in sat and 'line2' in sat]
+    if not valid_tle_satellites:
+        return []
+    return calculate_realistic_orbit_with_footprint(
+        valid_tle_satellites, side_angle, start_time=window_start
+    )
+
+@app.route('/tiles/coverage/<int:z>/<int:x>/<int:y>.png')
+def coverage_tile(z, x, y):
+    """覆盖热力图XYZ瓦片 - 统计时间窗口内条带覆盖次数"""
+    try:
+        if not (0 <= z <= MAX_TILE_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            return jsonify({'error': '瓦片坐标超出范围'}), 404
+
+        side_angle = request.args.get('side_angle', default=20.0, type=float)
+
+        # 每个不同的侧摆角都会产生新的缓存键和一次完整的轨道计算，因此限制范围并取整
+        if not (0 <= side_angle <= MAX_SIDE_ANGLE):
+            return jsonify({'error': f'侧摆角应在0到{MAX_SIDE_ANGLE:g}之间'}), 400
+        side_angle = round(side_angle / SIDE_ANGLE_STEP) * SIDE_ANGLE_STEP
+
+        window_start = time_bucket(bucket_seconds=TILE_WINDOW_SECONDS)
+        digest = catalog_hash(get_satellite_file_path())
+
+        etag = make_etag(digest, window_start, side_angle=side_angle, tile=[z, x, y])
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified_response(etag)
+
+        key = tile_cache_key(digest, window_start, side_angle)
+        png = coverage_tile_cache.get_tile(
+            key, z, x, y, lambda: load_coverage_swaths(side_angle, window_start)
+        )
+
+        response = Response(png, mimetype='image/png')
+        response.headers['ETag'] = etag
+        # 每次都向服务器验证ETag，卫星数据文件变化后客户端能立即拿到新瓦片
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    except SingleFlightTimeout as e:
+        logger.warning(f"等待覆盖条带计算超时: {e}")
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        logger.error(f"生成覆盖瓦片时发生错误: {e}")
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/calculate_revisit_time')
 def api_calculate_revisit_time():
     """API接口：计算重访时间"""
@@ -267,7 +431,10 @@ def api_health():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'satellite_file_exists': get_satellite_file_path() is not None,
-        'satellite_count': len(read_satellite_data())
+        'satellite_count': len(read_satellite_data()),
+        'ephemeris_scheduler': ephemeris_scheduler.status(),
+        'orbit_computations': orbit_flights.stats(),
+        'coverage_tiles': tile_flights.stats()
     })
 
 @app.route('/api/coverage_analysis')
@@ -382,6 +549,9 @@ def setup_app():
         with open(js_file, 'w', encoding='utf-8') as f:
             f.write("// JS文件将在此处加载")
 
+    # 预计算默认参数的星历并启动后台刷新
+    ephemeris_scheduler.start()
+
 if __name__ == '__main__':
     print("=" * 60)
     print("卫星轨道可视化系统")
@@ -420,6 +590,7 @@ if __name__ == '__main__':
     print("主页面: http://localhost:5000")
     print("卫星数据API: http://localhost:5000/get_satellite_data")
     print("健康检查: http://localhost:5000/api/health")
+    print("覆盖热力图瓦片: http://localhost:5000/tiles/coverage/{z}/{x}/{y}.png")
 
     # 运行应用
     app.run(
@@ -0,0 +1,350 @@
+import hashlib
+import math
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from ephemeris_cache import LRUCache
+from single_flight import SingleFlight
+
+
+# 瓦片像素尺寸
+TILE_SIZE = 256
+
+# 允许请求的最大缩放级别
+MAX_TILE_ZOOM = 12
+
+# 低于该级别的瓦片由下一级的4个子瓦片合成
+PYRAMID_BASE_ZOOM = 3
+
+# 覆盖统计的时间窗口对齐长度（秒）与窗口长度（小时）
+TILE_WINDOW_SECONDS = 3600
+TILE_WINDOW_HOURS = 24
+
+# 侧摆角范围与取整步长（与前端滑块一致），限制缓存键的数量
+MAX_SIDE_ANGLE = 60.0
+SIDE_ANGLE_STEP = 1.0
+
+# 内存中缓存的瓦片数量
+TILE_CACHE_SIZE = 512
+
+# 磁盘缓存中过期目录的保留时间（秒）
+DISK_CACHE_MAX_AGE = 2 * 24 * 3600
+
+# 光栅化时每次处理的四边形数量，限制 (块大小, 256, 4) 临时数组的内存
+RASTER_CHUNK_SIZE = 128
+
+# 相邻采样点之间经度跨度超过该值的条带段视为无效
+MAX_SEGMENT_LON_SPAN = 120.0
+
+# 颜色映射：覆盖次数 -> RGB，按log2插值
+_COLOR_STOPS = np.array([1, 2, 4, 8, 16], dtype=float)
+_COLOR_VALUES = np.array([
+    [43, 131, 186],
+    [171, 221, 164],
+    [255, 255, 191],
+    [253, 174, 97],
+    [215, 25, 28],
+], dtype=float)
+_COLOR_ALPHA = 160
+
+
+def tile_cache_key(catalog_digest, window_start, side_angle, window_hours=TILE_WINDOW_HOURS):
+    """由目录摘要、时间窗口和侧摆角生成瓦片缓存键"""
+    raw = f"{catalog_digest}|{window_start.isoformat()}|{window_hours}|{float(side_angle)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def tile_bounds(z, x, y):
+    """返回Web墨卡托瓦片的经纬度范围 (west, south, east, north)"""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def tile_row_latitudes(z, y):
+    """返回瓦片每一行像素中心的纬度"""
+    n = TILE_SIZE * 2 ** z
+    gy = y * TILE_SIZE + np.arange(TILE_SIZE) + 0.5
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * gy / n))))
+
+
+def swath_quads(satellite_data):
+    """
+    将卫星左右条带边界转换为四边形数组
+    每个四边形由相邻两个采样时刻的左右边界点组成: [L_i, R_i, R_i+1, L_i+1]
+    返回: (Q, 4, 2) 数组，最后一维为 (lon, lat)
+    """
+    quads = []
+    for sat in satellite_data:
+        left = np.asarray(sat.get('leftSwath', []), dtype=float).reshape(-1, 3)[:, :2]
+        right = np.asarray(sat.get('rightSwath', []), dtype=float).reshape(-1, 3)[:, :2]
+        count = min(len(left), len(right))
+        if count < 2:
+            continue
+        left, right = left[:count], right[:count]
+        quads.append(np.stack([left[:-1], right[:-1], right[1:], left[1:]], axis=1))
+
+    if not quads:
+        return np.empty((0, 4, 2))
+
+    quads = np.concatenate(quads)
+
+    # 以第一个顶点为参考展开经度，避免跨越日期变更线的四边形被拉伸
+    lon = quads[:, :, 0]
+    ref = lon[:, :1]
+    lon = ref + (lon - ref + 180.0) % 360.0 - 180.0
+    quads[:, :, 0] = lon
+
+    span = lon.max(axis=1) - lon.min(axis=1)
+    quads = quads[span < MAX_SEGMENT_LON_SPAN]
+
+    # 超出 [-180, 180] 的四边形在另一侧复制一份
+    lon_min = quads[:, :, 0].min(axis=1)
+    lon_max = quads[:, :, 0].max(axis=1)
+    shifted = []
+    for mask, offset in ((lon_max > 180.0, -360.0), (lon_min < -180.0, 360.0)):
+        if mask.any():
+            copy = quads[mask].copy()
+            copy[:, :, 0] += offset
+            shifted.append(copy)
+
+    if shifted:
+        quads = np.concatenate([quads] + shifted)
+    return quads
+
+
+def rasterize_coverage(quads, z, x, y):
+    """
+    统计瓦片内每个像素被条带覆盖的次数
+    按像素行对所有四边形做扫描线求交，再用差分数组累加，全部为向量化运算
+    返回: (TILE_SIZE, TILE_SIZE) uint16 数组
+    """
+    counts = np.zeros((TILE_SIZE, TILE_SIZE), dtype=np.uint16)
+    if len(quads) == 0:
+        return counts
+
+    west, south, east, north = tile_bounds(z, x, y)
+
+    # 只保留与瓦片范围相交的四边形
+    lon = quads[:, :, 0]
+    lat = quads[:, :, 1]
+    mask = ((lon.max(axis=1) >= west) & (lon.min(axis=1) <= east) &
+            (lat.max(axis=1) >= south) & (lat.min(axis=1) <= north))
+    quads = quads[mask]
+    if len(quads) == 0:
+        return counts
+
+    # 每行像素中心纬度: (1, R, 1)
+    row_lat = tile_row_latitudes(z, y)[None, :, None]
+    scale = TILE_SIZE / (east - west)
+
+    # 分块处理四边形，临时数组大小与目录规模无关
+    diff = np.zeros((TILE_SIZE, TILE_SIZE + 1), dtype=np.int32)
+    for start in range(0, len(quads), RASTER_CHUNK_SIZE):
+        _accumulate_spans(diff, quads[start:start + RASTER_CHUNK_SIZE], row_lat, west, scale)
+
+    counts[:] = np.cumsum(diff[:, :-1], axis=1)
+    return counts
+
+
+def _accumulate_spans(diff, quads, row_lat, west, scale):
+    """对一块四边形做扫描线求交，把每行覆盖的列区间累加到差分数组"""
+    # 各条边的端点: (Q, 1, 4)
+    ax = quads[:, None, :, 0]
+    ay = quads[:, None, :, 1]
+    bx = np.roll(quads[:, :, 0], -1, axis=1)[:, None, :]
+    by = np.roll(quads[:, :, 1], -1, axis=1)[:, None, :]
+
+    # 扫描线与各边求交: (Q, R, 4)
+    dy = by - ay
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (row_lat - ay) / dy
+    valid = (dy != 0) & (t >= 0) & (t <= 1)
+    xs = ax + t * (bx - ax)
+    x_min = np.where(valid, xs, np.inf).min(axis=2)
+    x_max = np.where(valid, xs, -np.inf).max(axis=2)
+
+    # 转换为像素列区间 [c0, c1)，以像素中心判断是否覆盖
+    hit = x_min <= x_max
+    c0 = np.ceil((x_min[hit] - west) * scale - 0.5)
+    c1 = np.floor((x_max[hit] - west) * scale - 0.5) + 1
+    c0 = np.clip(c0, 0, TILE_SIZE).astype(np.intp)
+    c1 = np.clip(c1, 0, TILE_SIZE).astype(np.intp)
+    rows = np.nonzero(hit)[1]
+
+    keep = c1 > c0
+    np.add.at(diff, (rows[keep], c0[keep]), 1)
+    np.add.at(diff, (rows[keep], c1[keep]), -1)
+
+
+def downsample_counts(children):
+    """
+    由4个子瓦片合成父瓦片
+    children: [[左上, 右上], [左下, 右下]] 的覆盖次数数组，按2x2取最大值
+    """
+    full = np.block(children)
+    return full.reshape(TILE_SIZE, 2, TILE_SIZE, 2).max(axis=(1, 3))
+
+
+def colorize(counts):
+    """将覆盖次数映射为RGBA图像，未覆盖的像素完全透明"""
+    rgba = np.zeros(counts.shape + (4,), dtype=np.uint8)
+    covered = counts > 0
+    if not covered.any():
+        return rgba
+
+    level = np.log2(counts[covered].astype(float))
+    stops = np.log2(_COLOR_STOPS)
+    for channel in range(3):
+        rgba[..., channel][covered] = np.interp(level, stops, _COLOR_VALUES[:, channel]).astype(np.uint8)
+    rgba[..., 3][covered] = _COLOR_ALPHA
+    return rgba
+
+
+def encode_png(rgba):
+    """将 (H, W, 4) uint8 数组编码为PNG"""
+    height, width = rgba.shape[:2]
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    # 每行前加过滤类型字节0
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', header) +
+            chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) +
+            chunk(b'IEND', b''))
+
+
+class CoverageTileCache:
+    """
+    覆盖热力图瓦片缓存
+    内存LRU + 磁盘缓存，缓存键包含目录摘要、时间窗口和侧摆角
+    低缩放级别的瓦片由高一级的子瓦片合成
+    """
+
+    def __init__(self, cache_dir=None, maxsize=TILE_CACHE_SIZE, flights=None, swath_flights=None):
+        """
+        flights: 合并相同瓦片覆盖次数计算的SingleFlight
+        swath_flights: 合并相同缓存键轨道条带计算的SingleFlight，默认与flights相同
+        """
+        self.cache_dir = cache_dir
+        self.flights = flights if flights is not None else SingleFlight()
+        self.swath_flights = swath_flights if swath_flights is not None else self.flights
+        self._tiles = LRUCache(maxsize)
+        self._counts = LRUCache(maxsize)
+        self._quads = LRUCache(4)
+        self._known_keys = set()
+
+    def get_tile(self, key, z, x, y, load_swaths):
+        """
+        获取PNG瓦片
+        load_swaths: 无参回调，返回含 leftSwath/rightSwath 的卫星数据列表
+        """
+        png = self._tiles.get((key, z, x, y))
+        if png is not None:
+            return png
+
+        png = self._read_disk(key, z, x, y)
+        if png is None:
+            counts = self.get_counts(key, z, x, y, load_swaths)
+            png = encode_png(colorize(counts))
+            self._write_disk(key, z, x, y, png)
+
+        self._tiles.put((key, z, x, y), png)
+        return png
+
+    def get_counts(self, key, z, x, y, load_swaths):
+        """获取瓦片的覆盖次数数组"""
+        counts = self._counts.get((key, z, x, y))
+        if counts is not None:
+            return counts
+
+        def compute():
+            # 等待期间其他线程可能已经完成计算
+            counts = self._counts.get((key, z, x, y))
+            if counts is not None:
+                return counts
+
+            if z < PYRAMID_BASE_ZOOM:
+                children = [[self.get_counts(key, z + 1, 2 * x + dx, 2 * y + dy, load_swaths)
+                             for dx in (0, 1)]
+                            for dy in (0, 1)]
+                counts = downsample_counts(children)
+            else:
+                counts = rasterize_coverage(self._get_quads(key, load_swaths), z, x, y)
+
+            self._counts.put((key, z, x, y), counts)
+            return counts
+
+        return self.flights.do(('counts', key, z, x, y), compute)
+
+    def _get_quads(self, key, load_swaths):
+        quads = self._quads.get(key)
+        if quads is not None:
+            return quads
+
+        def compute():
+            # 轨道计算、四边形转换和写入缓存都在同一次合并计算内完成，
+            # 避免计算结束到写入缓存之间到达的请求重复计算
+            quads = self._quads.get(key)
+            if quads is None:
+                quads = swath_quads(load_swaths())
+                self._quads.put(key, quads)
+            return quads
+
+        return self.swath_flights.do(('quads', key), compute)
+
+    def _tile_path(self, key, z, x, y):
+        return os.path.join(self.cache_dir, key, str(z), str(x), f"{y}.png")
+
+    def _read_disk(self, key, z, x, y):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._tile_path(key, z, x, y), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key, z, x, y, png):
+        if not self.cache_dir:
+            return
+        path = self._tile_path(key, z, x, y)
+        try:
+            if key not in self._known_keys:
+                self._known_keys.add(key)
+                self._prune_disk()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免并发读取到不完整的文件
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        """删除过期的缓存键目录"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name in self._known_keys or not os.path.isdir(path):
+                continue
+            if now - os.path.getmtime(path) > DISK_CACHE_MAX_AGE:
+                shutil.rmtree(path, ignore_errors=True)
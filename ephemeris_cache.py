@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# brotli为可选依赖，未安装时只提供gzip压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# 时间桶长度（秒），与轨道采样步长（5分钟）一致
+TIME_BUCKET_SECONDS = 300
+
+# 小于该大小的响应体不压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 响应缓存最多保留的条目数
+RESPONSE_CACHE_SIZE = 32
+
+# 文件路径 -> (mtime, size, digest)
+_catalog_digests = {}
+_catalog_lock = threading.Lock()
+
+
+def catalog_hash(tle_file_path):
+    """
+    计算TLE目录文件内容的SHA-256摘要
+    按 (mtime, size) 缓存，文件未变化时不重复读取
+    """
+    if not tle_file_path:
+        return 'none'
+
+    try:
+        stat = os.stat(tle_file_path)
+    except OSError:
+        return 'none'
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _catalog_lock:
+        cached = _catalog_digests.get(tle_file_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+    with open(tle_file_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+
+    with _catalog_lock:
+        _catalog_digests[tle_file_path] = (signature, digest)
+    return digest
+
+
+def time_bucket(now=None, bucket_seconds=TIME_BUCKET_SECONDS):
+    """返回时间所在时间桶的起始时间 (UTC)"""
+    if now is None:
+        now = datetime.utcnow()
+    epoch = datetime(1970, 1, 1)
+    seconds = int((now - epoch).total_seconds())
+    return epoch + timedelta(seconds=seconds - seconds % bucket_seconds)
+
+
+def make_etag(catalog_digest, bucket_start, **params):
+    """由目录摘要、时间桶和请求参数生成强ETag"""
+    key = json.dumps({
+        'catalog': catalog_digest,
+        'bucket': bucket_start.isoformat(),
+        'params': params,
+    }, sort_keys=True)
+    return '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def encoded_etag(etag, encoding):
+    """
+    返回某一编码表示的ETag
+    不同压缩编码是不同的表示，强ETag需要区分，例如 "<hash>-gzip"
+    """
+    if encoding == 'identity':
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    判断 If-None-Match 请求头是否与ETag的任一编码表示匹配
+    返回匹配的ETag，不匹配时返回None
+    """
+    if not if_none_match:
+        return None
+
+    variants = {encoded_etag(etag, encoding) for encoding in ('identity', 'gzip', 'br')}
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return etag
+        # If-None-Match 使用弱比较
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in variants:
+            return candidate
+    return None
+
+
+def choose_encoding(accept_encodings, entry):
+    """根据 Accept-Encoding 从缓存条目中选择编码，优先brotli"""
+    for encoding in ('br', 'gzip'):
+        if encoding in entry and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+def compress_body(body):
+    """对响应体进行压缩，返回 编码 -> 数据 的字典"""
+    encoded = {'identity': body}
+    if len(body) < COMPRESS_MIN_BYTES:
+        return encoded
+
+    encoded['gzip'] = gzip.compress(body, compresslevel=6)
+    if brotli is not None:
+        encoded['br'] = brotli.compress(body, quality=5)
+    return encoded
+
+
+class LRUCache:
+    """线程安全的简单LRU缓存"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class CompressedResponseCache:
+    """
+    线程安全的LRU缓存：ETag -> 各编码的响应体
+    压缩只在写入时进行一次，之后的请求直接复用
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE):
+        self._entries = LRUCache(maxsize)
+
+    def get(self, etag):
+        return self._entries.get(etag)
+
+    def put(self, etag, body):
+        entry = compress_body(body)
+        self._entries.put(etag, entry)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,145 @@
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+from ephemeris_cache import TIME_BUCKET_SECONDS, time_bucket
+
+logger = logging.getLogger(__name__)
+
+
+# 在时间桶结束前多少秒开始预计算下一个时间桶
+REFRESH_LEAD_SECONDS = 60
+
+# 检查目录文件变化和时间桶切换的间隔（秒）
+POLL_SECONDS = 5
+
+
+class EphemerisScheduler:
+    """
+    星历后台预计算调度器
+    启动时计算预热参数集的星历，在时间桶到期前预先计算下一个时间桶，
+    TLE目录文件变化时立即重新计算。
+    请求从只读快照 (ETag -> 响应缓存条目) 中读取，快照整体原子替换。
+    """
+
+    def __init__(self, build_entry, catalog_digest, side_angles=(20.0,),
+                 bucket_seconds=TIME_BUCKET_SECONDS, lead_seconds=REFRESH_LEAD_SECONDS,
+                 poll_seconds=POLL_SECONDS):
+        """
+        build_entry: 回调 (side_angle, bucket_start, digest) -> (etag, entry)
+        catalog_digest: 回调，返回当前TLE目录摘要
+        side_angles: 需要预热的侧摆角列表
+        bucket_seconds: 星历时间桶长度，即轨道起始时间的对齐粒度
+        poll_seconds: 检查目录变化和时间桶到期的间隔
+        """
+        self.build_entry = build_entry
+        self.catalog_digest = catalog_digest
+        self.side_angles = [float(angle) for angle in side_angles]
+        self.bucket_seconds = bucket_seconds
+        # 检查间隔不超过时间桶的1/4，提前量至少覆盖两次检查，保证到期前完成预计算
+        self.poll_seconds = min(max(poll_seconds, 1), bucket_seconds / 4)
+        self.lead_seconds = min(max(lead_seconds, 2 * self.poll_seconds), bucket_seconds / 2)
+
+        # 快照只整体替换，不在原对象上修改
+        self._snapshot = {}
+        self._built = {}
+        self._digest = None
+        self._last_refresh = None
+        self._last_error = None
+
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def lookup(self, etag):
+        """从当前快照中查找ETag对应的响应缓存条目"""
+        return self._snapshot.get(etag)
+
+    def start(self):
+        """同步完成首次预热，然后启动后台刷新线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        self.refresh()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='ephemeris-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"星历预计算调度器已启动，预热侧摆角: {self.side_angles}")
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_seconds):
+            self.refresh()
+
+    def _target_buckets(self, now):
+        """需要就绪的时间桶：当前时间桶，临近到期时加上下一个时间桶"""
+        current = time_bucket(now, self.bucket_seconds)
+        buckets = [current]
+        next_bucket = current + timedelta(seconds=self.bucket_seconds)
+        if (next_bucket - now).total_seconds() <= self.lead_seconds:
+            buckets.append(next_bucket)
+        return buckets
+
+    def refresh(self, now=None):
+        """
+        检查并刷新快照，返回是否发生了替换
+        计算失败时保留旧快照，下一次轮询重试
+        """
+        with self._refresh_lock:
+            if now is None:
+                now = datetime.utcnow()
+
+            try:
+                digest = self.catalog_digest()
+                catalog_changed = digest != self._digest
+                if catalog_changed and self._digest is not None:
+                    logger.info("检测到卫星数据文件变化，重新计算星历")
+
+                snapshot = {}
+                built = {}
+                for bucket_start in self._target_buckets(now):
+                    for side_angle in self.side_angles:
+                        key = (bucket_start, side_angle)
+                        etag = None if catalog_changed else self._built.get(key)
+                        if etag is not None and etag in self._snapshot:
+                            entry = self._snapshot[etag]
+                        else:
+                            etag, entry = self.build_entry(side_angle, bucket_start, digest)
+                        snapshot[etag] = entry
+                        built[key] = etag
+
+                if built == self._built and not catalog_changed:
+                    return False
+
+                self._snapshot = snapshot
+                self._built = built
+                self._digest = digest
+                self._last_refresh = datetime.utcnow()
+                self._last_error = None
+                logger.info(f"星历快照已更新，共 {len(snapshot)} 个条目")
+                return True
+
+            except Exception as e:
+                self._last_error = str(e)
+                logger.error(f"预计算星历时发生错误: {e}")
+                traceback.print_exc()
+                return False
+
+    def status(self):
+        """调度器状态，用于健康检查"""
+        return {
+            'running': self._thread is not None and self._thread.is_alive(),
+            'side_angles': self.side_angles,
+            'bucket_seconds': self.bucket_seconds,
+            'poll_seconds': self.poll_seconds,
+            'buckets': sorted({bucket.isoformat() + 'Z' for bucket, _ in self._built}),
+            'last_refresh': self._last_refresh.isoformat() + 'Z' if self._last_refresh else None,
+            'last_error': self._last_error,
+        }
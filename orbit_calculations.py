@@ -226,15 +226,19 @@ def calculate_satellite_position_with_sgp4(tle_line1, tle_line2, time_utc):
         return np.array([6878, 0, 0]), np.array([7.6, 0, 0]), 0, 0
 
 
-def calculate_realistic_orbit_with_footprint(satellites, side_angle=20):
+def calculate_realistic_orbit_with_footprint(satellites, side_angle=20, start_time=None):
     """
     使用SGP4算法和footprint函数计算卫星位置和条带边界
     satellites: 包含TLE数据的卫星列表
     side_angle: 侧摆角度
+    start_time: 轨道起始时间 (UTC)，默认为当前时间
     返回: 包含卫星位置、条带边界的数据列表
     """
     print(f"=== 使用SGP4算法和footprint函数计算卫星位置和条带边界 (侧摆角: {side_angle}°) ===")
 
+    if start_time is None:
+        start_time = datetime.utcnow()
+
     satellite_data = []
 
     for i, sat in enumerate(satellites):
@@ -249,7 +253,7 @@ def calculate_realistic_orbit_with_footprint(satellites, side_angle=20):
         for j in range(num_points):
             # 计算当前时间
             time_offset = j * time_step
-            current_time = datetime.utcnow() + timedelta(seconds=time_offset)
+            current_time = start_time + timedelta(seconds=time_offset)
 
             try:
                 # 使用SGP4计算卫星在TEME坐标系中的位置和速度
@@ -0,0 +1,83 @@
+import threading
+
+
+# 等待进行中计算的默认超时时间（秒）
+DEFAULT_TIMEOUT = 120
+
+
+class SingleFlightTimeout(TimeoutError):
+    """等待进行中的计算超时"""
+
+
+class _Call:
+    """一次进行中的计算"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    并发请求合并
+    相同键的并发调用只执行一次计算，其余调用等待并共享结果或异常。
+    计算完成后立即移除，不缓存已完成的结果。
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            'executed': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'timeouts': 0,
+        }
+
+    def do(self, key, fn, timeout=None):
+        """
+        执行 fn()，若相同键的计算正在进行则等待其结果
+        timeout: 等待者的超时时间（秒），执行计算的线程不受限制
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+                self._counters['executed'] += 1
+            else:
+                leader = False
+                self._counters['coalesced'] += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                with self._lock:
+                    self._counters['errors'] += 1
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            if timeout is None:
+                timeout = self.timeout
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self._counters['timeouts'] += 1
+                raise SingleFlightTimeout(f"等待计算结果超时 ({timeout}秒)")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """计数器和当前进行中的计算数量"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_flight'] = len(self._calls)
+        return stats
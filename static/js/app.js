@@ -87,6 +87,10 @@ document.addEventListener('DOMContentLoaded', function() {
         let showOrbits = true;
         let showProjections = true;
         let showLabels = true;
+        let showCoverage = false;
+
+        // 覆盖热力图图层
+        let coverageLayer = null;
 
         // 时间控制状态
         let isPlaying = false;
@@ -191,6 +195,7 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('toggleOrbits')?.addEventListener('click', toggleOrbits);
             document.getElementById('toggleProjections')?.addEventListener('click', toggleProjections);
             document.getElementById('toggleLabels')?.addEventListener('change', toggleLabels);
+            document.getElementById('toggleCoverage')?.addEventListener('change', toggleCoverage);
             document.getElementById('realTimeMode')?.addEventListener('change', toggleRealTimeMode);
             document.getElementById('playPauseButton')?.addEventListener('click', togglePlayPause);
             document.getElementById('resetTimeButton')?.addEventListener('click', resetTime);
@@ -365,6 +370,34 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
 
+        // 切换覆盖热力图
+        function toggleCoverage() {
+            showCoverage = document.getElementById('toggleCoverage').checked;
+            console.log(`切换覆盖热力图: ${showCoverage}`);
+            updateCoverageLayer();
+        }
+
+        // 按当前侧摆角重新创建覆盖热力图图层
+        function updateCoverageLayer() {
+            if (coverageLayer) {
+                viewer.imageryLayers.remove(coverageLayer);
+                coverageLayer = null;
+            }
+
+            if (!showCoverage) {
+                return;
+            }
+
+            coverageLayer = viewer.imageryLayers.addImageryProvider(
+                new Cesium.UrlTemplateImageryProvider({
+                    url: `/tiles/coverage/{z}/{x}/{y}.png?side_angle=${currentSideAngle}`,
+                    tilingScheme: new Cesium.WebMercatorTilingScheme(),
+                    maximumLevel: 12,
+                    hasAlphaChannel: true
+                })
+            );
+        }
+
         // 切换实时模式
         function toggleRealTimeMode() {
             const realTimeMode = document.getElementById('realTimeMode').checked;
@@ -398,8 +431,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentSideAngleElement.textContent = newAngle + '°';
             }
 
-            // 重新加载卫星数据
+            // 重新加载卫星数据和覆盖热力图
             loadSatelliteData();
+            updateCoverageLayer();
         }
 
         // 时间控制功能
@@ -668,11 +702,25 @@ document.addEventListener('DOMContentLoaded', function() {
             orbitEntities.length = 0;
             projectionEntities.length = 0;
 
+            // 星历采样起点，由服务器通过 X-Ephemeris-Epoch 返回
+            let ephemerisEpoch = startTime;
+            let ephemerisStop = stopTime;
+
             fetch(`/get_satellite_data?side_angle=${currentSideAngle}`)
                 .then(response => {
                     if (!response.ok) {
                         throw new Error(`HTTP错误! 状态: ${response.status}`);
                     }
+
+                    const epochHeader = response.headers.get('X-Ephemeris-Epoch');
+                    if (epochHeader) {
+                        try {
+                            ephemerisEpoch = Cesium.JulianDate.fromIso8601(epochHeader);
+                            ephemerisStop = Cesium.JulianDate.addSeconds(ephemerisEpoch, 24 * 3600, new Cesium.JulianDate());
+                        } catch (e) {
+                            console.warn("无法解析星历起始时间，使用页面时间:", e);
+                        }
+                    }
                     return response.json();
                 })
                 .then(data => {
@@ -763,7 +811,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
                             for (let i = 0; i < positions.length; i++) {
                                 const time = Cesium.JulianDate.addSeconds(
-                                    startTime,
+                                    ephemerisEpoch,
                                     i * timeStep,
                                     new Cesium.JulianDate()
                                 );
@@ -805,8 +853,8 @@ document.addEventListener('DOMContentLoaded', function() {
                                 },
                                 availability: new Cesium.TimeIntervalCollection([
                                     new Cesium.TimeInterval({
-                                        start: startTime,
-                                        stop: stopTime
+                                        start: ephemerisEpoch,
+                                        stop: ephemerisStop
                                     })
                                 ])
                             });